@@ -1,67 +1,140 @@
 # app.py
 import os
+import shutil
+import hashlib
+import tempfile
+import zipfile
+import threading
+import functools
+from collections import OrderedDict
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from flask import (
     Flask, render_template, request, send_file,
     redirect, url_for, session, flash, jsonify
 )
+from werkzeug.utils import secure_filename
+from docx.opc.exceptions import OpcError
 from dotenv import load_dotenv
-from compliance_logic import read_docx, check_compliance, modify_docx
+from compliance_logic import (
+    open_docx, scan_docx, missing_clauses, add_missing_clauses, save_docx
+)
 from email_smtp import send_email
+import history_db
 
 # Google Sheets (optional)
 import gspread
-from google.oauth2.service_account import Credentials
+from google_sheets_helper import get_client
 
 # Load .env from same folder as this file
 env_path = os.path.join(os.path.dirname(__file__), ".env")
 load_dotenv(dotenv_path=env_path)
 
+
+# Settings used on the request path, read from the environment once at startup
+@dataclass(frozen=True)
+class Cfg:
+    email_to: tuple
+    smtp_host: str
+    smtp_port: int
+    smtp_user: str
+    smtp_pass: str
+    team_name: str
+    default_theme: str
+    sheets_enabled: bool
+    sheets_credentials: str
+    sheet_id: str
+    sheet_tab: str
+
+
+CFG = Cfg(
+    email_to=tuple(r.strip() for r in (os.getenv("EMAIL_TO") or "").split(",") if r.strip()),
+    smtp_host=os.getenv("EMAIL_SMTP_HOST") or os.getenv("EMAIL_HOST"),
+    smtp_port=int(os.getenv("EMAIL_SMTP_PORT") or os.getenv("EMAIL_PORT") or 587),
+    smtp_user=os.getenv("EMAIL_FROM"),
+    smtp_pass=os.getenv("EMAIL_PASSWORD"),
+    team_name=os.getenv("EMAIL_TEAM_NAME") or "Team",
+    default_theme=os.getenv("DEFAULT_THEME", "dark"),
+    sheets_enabled=os.getenv("GOOGLE_SHEETS_ENABLED") == "true",
+    sheets_credentials=os.getenv("GOOGLE_SHEETS_CREDENTIALS"),
+    sheet_id=os.getenv("GOOGLE_SHEET_ID"),
+    sheet_tab=os.getenv("GOOGLE_SHEET_TAB"),
+)
+
 UPLOAD_FOLDER = "contracts"
 MODIFIED_FOLDER = "modified"
 
+# Copy buffer for writing uploads to disk (1 MB instead of Werkzeug's 16 KB default)
+UPLOAD_BUFFER_SIZE = 1 << 20
+
+# What python-docx raises for a body that isn't a .docx (not a zip / missing parts / bad XML)
+INVALID_DOCX_ERRORS = (OpcError, zipfile.BadZipFile, KeyError, SyntaxError)
+
+
+class InvalidDocxError(ValueError):
+    """The uploaded file could not be opened as a .docx (raised only around open_docx)."""
+
+
 app = Flask(__name__, static_folder="static", template_folder="templates")
 # secret key for session (theme stored in session)
 app.secret_key = os.getenv("FLASK_SECRET_KEY", "dev-secret-key-please-change")
 
 # small site config used in templates
 app.config["SITE_OWNER"] = os.getenv("SITE_OWNER", "You")
+# reject oversized uploads before they are read (default 100 MB)
+app.config["MAX_CONTENT_LENGTH"] = int(os.getenv("MAX_UPLOAD_MB", "100")) * 1024 * 1024
 
 # make sure upload folders exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(MODIFIED_FOLDER, exist_ok=True)
 
-# In-memory history store (A: store only in memory)
-# Each entry: {id, original_filename, saved_filename, updated_filename, missing, timestamp, email_status, sheet_status}
-app_history = []
+# Analysis results keyed by upload content hash: digest -> (missing, modified_path, (mtime_ns, size))
+# Re-uploads of the same bytes skip parsing/modifying and copy the earlier modified file,
+# as long as that file still has the stat signature it had when it was written
+# LRU order, shared by threaded request handlers, so every access goes through the lock
+ANALYSIS_CACHE_SIZE = 512
+analysis_cache = OrderedDict()
+analysis_cache_lock = threading.Lock()
+
+# Background workers for email + Google Sheets so /upload doesn't wait on the network
+EXECUTOR = ThreadPoolExecutor(max_workers=4)
 
 # Make os and config available in templates (avoids UndefinedError for os/config)
 app.jinja_env.globals["os"] = os
 app.jinja_env.globals["config"] = app.config
 
+# Helper: open the Google Sheets worksheet once and reuse the authorized session
+@functools.lru_cache(maxsize=1)
+def _get_worksheet():
+    # Credentials are parsed once and shared with google_sheets_helper
+    return get_client(CFG.sheets_credentials).open_by_key(CFG.sheet_id).worksheet(CFG.sheet_tab)
+
+
 # Helper: write to Google Sheets (kept same behaviour)
 def write_to_google_sheet(original_file, missing_clauses, email_status):
     try:
-        if os.getenv("GOOGLE_SHEETS_ENABLED") != "true":
+        if not CFG.sheets_enabled:
             return "Google Sheets logging disabled"
 
-        credentials_file = os.getenv("GOOGLE_SHEETS_CREDENTIALS")
-        sheet_id = os.getenv("GOOGLE_SHEET_ID")
-        sheet_tab = os.getenv("GOOGLE_SHEET_TAB")
-
-        scopes = ["https://www.googleapis.com/auth/spreadsheets"]
-        creds = Credentials.from_service_account_file(credentials_file, scopes=scopes)
-        client = gspread.authorize(creds)
-
-        sheet = client.open_by_key(sheet_id).worksheet(sheet_tab)
-
         missing_text = ", ".join(missing_clauses) if missing_clauses else "No missing clauses"
-
-        sheet.append_row([
-            original_file,
-            missing_text,
-            email_status,
-        ])
+        # Sheets cells take scalars, so log the status string rather than the result dict
+        if isinstance(email_status, dict):
+            email_status = email_status.get("status", "")
+
+        try:
+            _get_worksheet().append_row([
+                original_file,
+                missing_text,
+                email_status,
+            ])
+        except gspread.exceptions.APIError as e:
+            # Expired/revoked credentials: re-authenticate on the next call. Other errors
+            # (quota, transient 5xx) keep the warm client and worksheet.
+            if e.response is not None and e.response.status_code in (401, 403):
+                _get_worksheet.cache_clear()
+                get_client.cache_clear()
+            raise
 
         return "Logged to Google Sheets"
 
@@ -69,58 +142,8 @@ def write_to_google_sheet(original_file, missing_clauses, email_status):
         return f"Google Sheets Error: {str(e)}"
 
 
-# Context processor to expose theme and a few convenient items to templates
-@app.context_processor
-def inject_template_defaults():
-    theme = session.get("theme", os.getenv("DEFAULT_THEME", "dark"))  # B: theme stored in session
-    return {
-        "current_theme": theme,
-        "updated_filename": (app_history[-1]["updated_filename"] if app_history else None),
-        "email_status_global": (app_history[-1]["email_status"] if app_history else None),
-        "sheet_status_global": (app_history[-1]["sheet_status"] if app_history else None),
-    }
-
-
-@app.route("/")
-def index():
-    # upload_page.html (templates were renamed by you)
-    return render_template("upload_page.html")
-
-
-@app.route("/upload", methods=["POST"])
-def upload():
-    if "file" not in request.files:
-        flash("No file selected", "danger")
-        return redirect(url_for("index"))
-
-    file = request.files["file"]
-
-    if file.filename == "":
-        flash("Empty filename", "danger")
-        return redirect(url_for("index"))
-
-    # Save uploaded file
-    saved_filename = file.filename
-    saved_path = os.path.join(UPLOAD_FOLDER, saved_filename)
-
-    # If a file with same name exists, add timestamp suffix to avoid permission/overwrite issues
-    if os.path.exists(saved_path):
-        base, ext = os.path.splitext(saved_filename)
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        saved_filename = f"{base}_{timestamp}{ext}"
-        saved_path = os.path.join(UPLOAD_FOLDER, saved_filename)
-
-    file.save(saved_path)
-
-    # Read and analyze
-    content = read_docx(saved_path)
-    missing = check_compliance(content)
-
-    # Prepare modified file
-    modified_filename = saved_filename.replace(".docx", "_modified.docx")
-    modified_path = os.path.join(MODIFIED_FOLDER, modified_filename)
-    modify_docx(saved_path, modified_path, missing)
-
+# Helper: build and send the compliance summary email (runs on EXECUTOR)
+def send_report_email(saved_filename, missing):
     # Prepare textual missing summary
     if missing:
         missing_text = "\n".join(f"- {m}" for m in missing)
@@ -128,7 +151,7 @@ def upload():
         missing_text = "✅ No missing clauses — fully compliant."
 
     # Email body
-    email_message = f"""Hello {os.getenv('EMAIL_TEAM_NAME') or 'Team'},
+    email_message = f"""Hello {CFG.team_name},
 
 Contract checked: {saved_filename}
 
@@ -143,8 +166,7 @@ Compliance Checker AI System
 
     # Send email (safe wrapped)
     try:
-        recipients_env = os.getenv("EMAIL_TO") or ""
-        recipients = [r.strip() for r in recipients_env.split(",") if r.strip()]
+        recipients = list(CFG.email_to)
         if not recipients:
             email_status = {"status": "no_recipients", "message": "No recipients configured"}
         else:
@@ -152,10 +174,10 @@ Compliance Checker AI System
                 subject="Compliance Checker Update",
                 body=email_message,
                 recipients=recipients,
-                smtp_server=os.getenv("EMAIL_SMTP_HOST") or os.getenv("EMAIL_HOST"),
-                smtp_port=int(os.getenv("EMAIL_SMTP_PORT") or os.getenv("EMAIL_PORT") or 587),
-                smtp_user=os.getenv("EMAIL_FROM"),
-                smtp_password=os.getenv("EMAIL_PASSWORD"),
+                smtp_server=CFG.smtp_host,
+                smtp_port=CFG.smtp_port,
+                smtp_user=CFG.smtp_user,
+                smtp_password=CFG.smtp_pass,
             )
             # Expect send_email to return a dict or similar; normalize
             if isinstance(send_result, dict):
@@ -166,12 +188,119 @@ Compliance Checker AI System
     except Exception as e:
         email_status = {"status": "error", "message": str(e)}
 
-    # Log to Google Sheets (optional)
-    sheet_status = write_to_google_sheet(saved_filename, missing, email_status)
+    return email_status
+
+
+# Context processor to expose theme and a few convenient items to templates
+@app.context_processor
+def inject_template_defaults():
+    theme = session.get("theme", CFG.default_theme)  # B: theme stored in session
+    latest = history_db.latest_run()
+    return {
+        "current_theme": theme,
+        "updated_filename": (latest[0] if latest else None),
+        "email_status_global": (latest[1] if latest else None),
+        "sheet_status_global": (latest[2] if latest else None),
+    }
+
+
+@app.route("/")
+def index():
+    # upload_page.html (templates were renamed by you)
+    return render_template("upload_page.html")
+
+
+# Helper: pick a path in UPLOAD_FOLDER that doesn't overwrite an earlier upload
+def _unique_upload_path(filename):
+    saved_filename = filename
+    saved_path = os.path.join(UPLOAD_FOLDER, saved_filename)
+
+    # If a file with same name exists, add timestamp suffix to avoid permission/overwrite issues
+    if os.path.exists(saved_path):
+        base, ext = os.path.splitext(saved_filename)
+        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        saved_filename = f"{base}_{timestamp}{ext}"
+        saved_path = os.path.join(UPLOAD_FOLDER, saved_filename)
+
+    return saved_filename, saved_path
 
-    # Add to in-memory history (A: store only in memory)
+
+# Helper: write an upload via write_body(fileobj) to a temp name (".part", so the CLI's
+# *.docx scan never sees it) and only move it into place once the whole body arrived
+# (no 413/disconnect leftovers); returns (saved_filename, saved_path)
+def _store_upload(filename, write_body):
+    fd, tmp_path = tempfile.mkstemp(dir=UPLOAD_FOLDER, prefix=".upload-", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            write_body(out)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+    saved_filename, saved_path = _unique_upload_path(filename)
+    os.replace(tmp_path, saved_path)
+    return saved_filename, saved_path
+
+
+# Helper: BLAKE2b digest of a saved upload, read in UPLOAD_BUFFER_SIZE chunks
+def _file_digest(path):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while chunk := f.read(UPLOAD_BUFFER_SIZE):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+# Helper: (mtime_ns, size) of a file, or None if it is gone; detects a cached modified
+# file that was since overwritten by another upload with the same name
+def _stat_signature(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+# Helper: analyze a saved upload, write the modified copy and queue email/sheet logging
+def _process_upload(saved_filename, saved_path):
+    modified_filename = saved_filename.replace(".docx", "_modified.docx")
+    modified_path = os.path.join(MODIFIED_FOLDER, modified_filename)
+
+    digest = _file_digest(saved_path)
+    with analysis_cache_lock:
+        cached = analysis_cache.get(digest)
+        if cached:
+            analysis_cache.move_to_end(digest)
+
+    if cached and _stat_signature(cached[1]) == cached[2]:
+        # Same contract bytes seen before: reuse the result and the modified file
+        missing = list(cached[0])
+        if not (os.path.exists(modified_path) and os.path.samefile(cached[1], modified_path)):
+            shutil.copy(cached[1], modified_path)
+    else:
+        # Parse once; scan with early exit, then modify and save the same Document
+        try:
+            doc = open_docx(saved_path)
+        except INVALID_DOCX_ERRORS as e:
+            raise InvalidDocxError(str(e)) from e
+        missing = missing_clauses(scan_docx(doc))
+
+        # Prepare modified file
+        add_missing_clauses(doc, missing)
+        save_docx(doc, modified_path)
+
+        with analysis_cache_lock:
+            analysis_cache[digest] = (tuple(missing), modified_path, _stat_signature(modified_path))
+            analysis_cache.move_to_end(digest)
+            while len(analysis_cache) > ANALYSIS_CACHE_SIZE:
+                analysis_cache.popitem(last=False)  # drop the least recently used entry
+
+    # Email + Google Sheets run in the background; the page polls for their status
+    email_status = {"status": "queued", "message": "Email queued"}
+    sheet_status = "queued"
+
+    # Add to run history (SQLite)
     history_entry = {
-        "id": len(app_history) + 1,
         "original_filename": saved_filename,
         "saved_filename": saved_filename,
         "updated_filename": modified_filename,
@@ -180,36 +309,151 @@ Compliance Checker AI System
         "email_status": email_status,
         "sheet_status": sheet_status,
     }
-    app_history.insert(0, history_entry)  # newest first
+    run_id = history_db.add_run(
+        saved_filename, modified_filename, missing,
+        history_entry["timestamp"], email_status, sheet_status,
+    )
+    history_entry["id"] = run_id
+
+    # Each job writes its result into the run's row; a status still "queued" means in flight
+    def mail_job():
+        result = send_report_email(saved_filename, missing)
+        history_db.set_email_status(run_id, result)
+        return result
+
+    def sheet_job():
+        # Sheet row records the final email status, so it waits on the mail job
+        result = write_to_google_sheet(saved_filename, missing, fut_mail.result())
+        history_db.set_sheet_status(run_id, result)
+        return result
+
+    fut_mail = EXECUTOR.submit(mail_job)
+    EXECUTOR.submit(sheet_job)
+
+    return history_entry
+
+
+@app.route("/upload", methods=["POST"])
+def upload():
+    if "file" not in request.files:
+        flash("No file selected", "danger")
+        return redirect(url_for("index"))
+
+    file = request.files["file"]
+
+    if file.filename == "":
+        flash("Empty filename", "danger")
+        return redirect(url_for("index"))
+
+    # Save uploaded file
+    saved_filename, saved_path = _store_upload(
+        file.filename, lambda out: file.save(out, buffer_size=UPLOAD_BUFFER_SIZE)
+    )
+
+    # An upload that can't be analysed is not kept in contracts/
+    try:
+        history_entry = _process_upload(saved_filename, saved_path)
+    except InvalidDocxError:
+        os.unlink(saved_path)
+        flash("Uploaded file is not a valid .docx file", "danger")
+        return render_template("upload_page.html"), 400
+    except BaseException:
+        os.unlink(saved_path)
+        raise
 
     # Render analysis_output.html
     return render_template(
         "analysis_output.html",
         original_filename=saved_filename,
         saved_filename=saved_filename,
-        updated_filename=modified_filename,
-        missing=missing,
-        email_status=email_status,
-        sheet_status=sheet_status
+        updated_filename=history_entry["updated_filename"],
+        missing=history_entry["missing"],
+        email_status=history_entry["email_status"],
+        sheet_status=history_entry["sheet_status"],
+        history_id=history_entry["id"],
+    )
+
+
+# Raw-body upload: streams request.stream straight to disk, skipping the multipart parser
+# Usage: POST the .docx bytes as the body with an X-Filename header
+@app.route("/upload-stream", methods=["POST"])
+def upload_stream():
+    filename = secure_filename(request.headers.get("X-Filename", ""))
+    if not filename:
+        return jsonify({"error": "X-Filename header required"}), 400
+
+    saved_filename, saved_path = _store_upload(
+        filename, lambda out: shutil.copyfileobj(request.stream, out, length=UPLOAD_BUFFER_SIZE)
+    )
+
+    try:
+        history_entry = _process_upload(saved_filename, saved_path)
+    except InvalidDocxError:
+        os.unlink(saved_path)
+        return jsonify({"error": "Request body is not a valid .docx file"}), 400
+    except BaseException:
+        os.unlink(saved_path)
+        raise
+
+    return jsonify({
+        "id": history_entry["id"],
+        "saved_filename": saved_filename,
+        "updated_filename": history_entry["updated_filename"],
+        "missing": history_entry["missing"],
+        "email_status": history_entry["email_status"],
+        "sheet_status": history_entry["sheet_status"],
+    })
+
+
+# Helper: attachment download that answers If-None-Match / If-Modified-Since with 304
+# Contracts are confidential: "private, no-cache" keeps them out of shared caches and makes
+# the browser revalidate every time, so repeat downloads cost a 304 instead of the file
+def _send_download(path):
+    resp = send_file(
+        path,
+        as_attachment=True,
+        conditional=True,
+        etag=True,
+        last_modified=os.path.getmtime(path),
+        max_age=0,
     )
+    resp.cache_control.private = True
+    return resp
 
 
 @app.route("/download/uploads/<path:filename>")
 def download_upload(filename):
     path = os.path.join(UPLOAD_FOLDER, filename)
-    return send_file(path, as_attachment=True)
+    return _send_download(path)
 
 
 @app.route("/download/updated/<path:filename>")
 def download_modified(filename):
     path = os.path.join(MODIFIED_FOLDER, filename)
-    return send_file(path, as_attachment=True)
+    return _send_download(path)
+
+
+# Simple API: background email/sheet status for one history entry (polled by analysis page)
+@app.route("/api/history/<int:entry_id>/status")
+def history_status(entry_id):
+    entry = history_db.get_run(entry_id)
+    if entry is None:
+        return jsonify({"error": "not found"}), 404
+
+    # Read from the row, so any worker process can answer for any run
+    done = entry["email_status"].get("status") != "queued" and entry["sheet_status"] != "queued"
+    return jsonify({
+        "id": entry["id"],
+        "done": done,
+        "email_status": entry["email_status"],
+        "sheet_status": entry["sheet_status"],
+    })
 
 
-# History page (shows in-memory runs)
+# History page (shows the latest 100 runs)
 @app.route("/history")
 def history_page():
-    return render_template("history_page.html", history=app_history)
+    return render_template("history_page.html", history=history_db.recent_runs(100))
 
 
 # Settings page: GET shows current theme, POST toggles/stores theme in session (B: theme in session)
@@ -224,7 +468,7 @@ def settings():
             flash("Invalid theme selection", "danger")
         return redirect(url_for("settings"))
 
-    current_theme = session.get("theme", os.getenv("DEFAULT_THEME", "dark"))
+    current_theme = session.get("theme", CFG.default_theme)
     return render_template("settings_page.html", current_theme=current_theme)
 
 
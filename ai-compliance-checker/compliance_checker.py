@@ -1,9 +1,11 @@
 import os
+import re
 import docx
-from rapidfuzz import fuzz
+from docx.oxml.ns import qn
+from rapidfuzz import fuzz, process
 from email_smtp import send_email
-import gspread
-from google.oauth2.service_account import Credentials
+import functools
+from google_sheets_helper import get_client
 from dotenv import load_dotenv
 from gspread_formatting import *
 
@@ -15,17 +17,48 @@ load_dotenv()
 GOOGLE_SHEET_ID = os.getenv("GOOGLE_SHEET_ID")
 SERVICE_ACCOUNT_FILE = os.getenv("GOOGLE_SERVICE_CREDS")
 
-if not SERVICE_ACCOUNT_FILE:
-    raise ValueError("SERVICE_ACCOUNT_FILE not set. Check your .env file.")
-
-SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
-
 # -------------------------------
-# ✅ Google Sheets Setup
+# ✅ Google Sheets Setup (lazy: nothing is parsed or opened until the first write)
 # -------------------------------
-creds = Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-gs_client = gspread.authorize(creds)
-sheet = gs_client.open_by_key(GOOGLE_SHEET_ID).sheet1
+@functools.lru_cache(maxsize=1)
+def _sheet():
+    if not SERVICE_ACCOUNT_FILE:
+        raise ValueError("SERVICE_ACCOUNT_FILE not set. Check your .env file.")
+    # Reuses the client (and parsed credentials) cached in google_sheets_helper
+    gs_client = get_client(SERVICE_ACCOUNT_FILE)
+    sheet = gs_client.open_by_key(GOOGLE_SHEET_ID).sheet1
+    _install_row_colors(sheet)
+    return sheet
+
+# Rows are colored by column C (missing clauses): "None" means fully compliant
+_ROW_COLOR_RANGE = "A2:C"
+_ROW_COLOR_RULES = (
+    ('=AND($C2<>"", $C2<>"None")', CellFormat(backgroundColor=color(1, 0.6, 0.6))),  # light red for issues
+    ('=$C2="None"', CellFormat(backgroundColor=color(0.6, 1, 0.6))),  # light green if all clauses present
+)
+
+def _rule_formula(rule):
+    condition = getattr(getattr(rule, "booleanRule", None), "condition", None)
+    values = getattr(condition, "values", None) or []
+    return values[0].userEnteredValue if values else None
+
+def _install_row_colors(sheet):
+    """Add the red/green conditional-format rules unless the sheet already has them."""
+    rules = get_conditional_format_rules(sheet)
+    existing = {_rule_formula(rule) for rule in rules}
+
+    added = False
+    for formula, fmt in _ROW_COLOR_RULES:
+        if formula in existing:
+            continue
+        rules.append(ConditionalFormatRule(
+            ranges=[GridRange.from_a1_range(_ROW_COLOR_RANGE, sheet)],
+            booleanRule=BooleanRule(condition=BooleanCondition("CUSTOM_FORMULA", [formula]), format=fmt),
+        ))
+        added = True
+
+    if added:
+        rules.save()
 
 # -------------------------------
 # ✅ Clause Keywords
@@ -50,25 +83,37 @@ CLAUSE_KEYWORDS = {
     ],
 }
 
+# Lowercase keywords once; extracted text is already lowercase
+_KW_LOWER = {clause: [kw.lower() for kw in keywords] for clause, keywords in CLAUSE_KEYWORDS.items()}
+
+# One exact-match regex per clause; fuzzy matching is only a fallback
+_CLAUSE_RES = {clause: re.compile("|".join(map(re.escape, keywords))) for clause, keywords in _KW_LOWER.items()}
+
+# Fuzzy fallback scores keywords against sentences, not the whole document
+_SENTENCE_SPLIT = re.compile(r"[.\n]+")
+FUZZY_THRESHOLD = 70
+# At least as long as any keyword, so padded sentences are always the longer string
+_FUZZY_PAD = "\0" * max(len(kw) for keywords in CLAUSE_KEYWORDS.values() for kw in keywords)
+
 CONTRACT_DIR = "contracts"
 
+_W_P = qn("w:p")
+_W_T = qn("w:t")
+
 # -------------------------------
 # ✅ Extract text from .docx
 # -------------------------------
 def extract_text_from_docx(file_path):
     try:
         doc = docx.Document(file_path)
+        body = doc.element.body
         parts = []
 
-        for p in doc.paragraphs:
-            if p.text.strip():
-                parts.append(p.text)
-
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    if cell.text.strip():
-                        parts.append(cell.text)
+        # One lxml traversal covers body paragraphs and table cells alike
+        for p in body.iter(_W_P):
+            text = "".join([t.text for t in p.iter(_W_T) if t.text])
+            if text.strip():
+                parts.append(text)
 
         return "\n".join(parts).lower()
 
@@ -81,39 +126,71 @@ def extract_text_from_docx(file_path):
 # -------------------------------
 def detect_present_clauses(text):
     found = set()
-    for clause, keywords in CLAUSE_KEYWORDS.items():
-        for kw in keywords:
-            if fuzz.partial_ratio(kw.lower(), text) > 70:
+
+    # One C-level search per clause, each stopping at its first keyword hit
+    for clause, pattern in _CLAUSE_RES.items():
+        if pattern.search(text):
+            found.add(clause)
+
+    if len(found) == len(CLAUSE_KEYWORDS):
+        return list(found)
+
+    # Fuzzy fallback only for clauses with no exact hit: one batched
+    # keyword x sentence partial_ratio matrix, computed in C across all cores
+    remaining = [(clause, keywords) for clause, keywords in _KW_LOWER.items() if clause not in found]
+    # Pad each sentence with filler on both sides: partial_ratio also scores windows
+    # that run off the end of a string, so without padding every sentence boundary
+    # would let a keyword score on its tail alone (e.g. "associate agreement" vs
+    # "...this agreement"). Filler never matches, so the keyword must fit inside the sentence.
+    sentences = [_FUZZY_PAD + s + _FUZZY_PAD for s in _SENTENCE_SPLIT.split(text) if s.strip()]
+    if not remaining or not sentences:
+        return list(found)
+
+    all_keywords = [kw for _, keywords in remaining for kw in keywords]
+    scores = process.cdist(
+        all_keywords, sentences, scorer=fuzz.partial_ratio,
+        score_cutoff=FUZZY_THRESHOLD, workers=-1
+    )
+    best = scores.max(axis=1)
+
+    start = 0
+    for clause, keywords in remaining:
+        for kw, score in zip(keywords, best[start:start + len(keywords)]):
+            if score > FUZZY_THRESHOLD:
                 found.add(clause)
                 break
+        start += len(keywords)
     return list(found)
 
-def find_missing_clauses(text):
-    present = detect_present_clauses(text)
+def find_missing_clauses(text, present=None):
+    if present is None:
+        present = detect_present_clauses(text)
     return [clause for clause in CLAUSE_KEYWORDS if clause not in present]
 
 # -------------------------------
-# ✅ Write Results to Google Sheets with coloring
+# ✅ Write Results to Google Sheets (colored via conditional formatting)
 # -------------------------------
+def log_results_to_sheet(results):
+    """Append one row per (filename, present, missing) in a single Sheets call.
+
+    Row colors come from the conditional-format rules installed by _sheet().
+    """
+    if not results:
+        return
+
+    rows = [
+        [
+            filename,
+            ", ".join(present) if present else "None",
+            ", ".join(missing) if missing else "None"
+        ]
+        for filename, present, missing in results
+    ]
+
+    _sheet().append_rows(rows, table_range="A1")
+
 def log_to_sheet(filename, present, missing):
-    # Append row
-    new_row_index = len(sheet.get_all_values()) + 1
-    sheet.append_row([
-        filename,
-        ", ".join(present) if present else "None",
-        ", ".join(missing) if missing else "None"
-    ])
-
-    # Apply formatting
-    if missing:
-        # Red background for issues
-        fmt = CellFormat(backgroundColor=color(1, 0.6, 0.6))  # light red
-    else:
-        # Green background if all clauses present
-        fmt = CellFormat(backgroundColor=color(0.6, 1, 0.6))  # light green
-
-    # Apply formatting to the new row
-    format_cell_range(sheet, f"A{new_row_index}:C{new_row_index}", fmt)
+    log_results_to_sheet([(filename, present, missing)])
 
 # -------------------------------
 # ✅ Main Compliance Checker
@@ -126,6 +203,9 @@ def check_compliance():
     smtp_user = os.getenv("EMAIL_FROM")
     smtp_password = os.getenv("EMAIL_PASSWORD")
 
+    # Sheet rows are buffered and written in one batch after the loop
+    results = []
+
     for file_name in os.listdir(CONTRACT_DIR):
         if not file_name.endswith(".docx"):
             continue
@@ -135,12 +215,12 @@ def check_compliance():
 
         text = extract_text_from_docx(path)
         present = detect_present_clauses(text)
-        missing = find_missing_clauses(text)
+        missing = find_missing_clauses(text, present)
 
         print(f"📄 Extracted Preview: {text[:150]}...\n")
 
-        # ✅ Log into Google Sheets with color
-        log_to_sheet(file_name, present, missing)
+        # ✅ Queue for Google Sheets (logged after the loop)
+        results.append((file_name, present, missing))
 
         # ✅ Email only if missing clauses
         if missing:
@@ -164,5 +244,8 @@ def check_compliance():
         else:
             print("✅ All clauses present.")
 
+    # ✅ Log every contract into Google Sheets (colored by the sheet's rules)
+    log_results_to_sheet(results)
+
 if __name__ == "__main__":
     check_compliance()
@@ -1,4 +1,7 @@
+import os
+import re
 import docx
+from docx.oxml.ns import qn
 
 # REQUIRED CLAUSES
 REQUIRED_CLAUSES = {
@@ -8,23 +11,83 @@ REQUIRED_CLAUSES = {
     "payment terms": ["payment terms", "fees", "payment schedule"]
 }
 
+# ✅ Normalize keywords once at import so matching only sees lowercase strings
+_REQUIRED_CLAUSES_LOWER = tuple(
+    (clause, tuple(keyword.lower() for keyword in keywords))
+    for clause, keywords in REQUIRED_CLAUSES.items()
+)
+
+# ✅ Compile each clause's keywords into one alternation. A clause is then a single
+# C-level search that stops at its first hit, with no Python work per match.
+_CLAUSE_RES = tuple(
+    (clause, re.compile("|".join(map(re.escape, keywords))))
+    for clause, keywords in _REQUIRED_CLAUSES_LOWER
+)
+
+
+_W_P = qn("w:p")
+_W_T = qn("w:t")
+
+
+# ✅ Open a DOCX once; pass the Document to extract_text / scan_docx / add_missing_clauses / save_docx
+def open_docx(filepath):
+    return docx.Document(filepath)
+
+
+# Accept either a path or an already-opened python-docx Document
+def _as_document(doc_or_path):
+    if isinstance(doc_or_path, (str, os.PathLike)):
+        return open_docx(doc_or_path)
+    return doc_or_path
+
+
+# Yield the text of each non-empty paragraph (body and table cells)
+def _iter_paragraph_texts(doc):
+    # Walk the XML once with lxml instead of python-docx's per-paragraph .text;
+    # runs are joined per paragraph so keywords split across runs still match
+    for p in doc.element.body.iter(_W_P):
+        text = "".join([t.text for t in p.iter(_W_T) if t.text])
+        if text:
+            yield text
+
+
+# ✅ Lowercased text of an opened Document
+def extract_text(doc):
+    return "\n".join(_iter_paragraph_texts(doc)).lower()
+
 
 # ✅ Read DOCX content
 def read_docx(filepath):
-    doc = docx.Document(filepath)
-    text = "\n".join([para.text for para in doc.paragraphs])
-    return text.lower()
+    return extract_text(open_docx(filepath))
 
 
-# ✅ Find missing clauses
+# ✅ Clauses not in the found set, in REQUIRED_CLAUSES order
+def missing_clauses(found):
+    return [clause for clause in REQUIRED_CLAUSES if clause not in found]
+
+
+# ✅ Find missing clauses (expects the lowercased text from read_docx)
 def check_compliance(text):
-    missing = []
+    return [clause for clause, pattern in _CLAUSE_RES if not pattern.search(text)]
+
 
-    for clause, keywords in REQUIRED_CLAUSES.items():
-        if not any(keyword in text for keyword in keywords):
-            missing.append(clause)
+# ✅ Read + check in one pass: scan paragraph by paragraph and stop once every clause is found
+# (no full-document string is built). Takes a path or an opened Document.
+def scan_docx(doc):
+    doc = _as_document(doc)
+    found = set()
+    remaining = list(_CLAUSE_RES)
 
-    return missing
+    for text in _iter_paragraph_texts(doc):
+        text = text.lower()
+        hits = [clause for clause, pattern in remaining if pattern.search(text)]
+        if hits:
+            found.update(hits)
+            if len(found) == len(REQUIRED_CLAUSES):
+                return found
+            remaining = [(clause, pattern) for clause, pattern in remaining if clause not in found]
+
+    return found
 
 
 # ✅ Modify TXT files (optional)
@@ -34,10 +97,8 @@ def modify_txt(filepath, missing_clauses):
             f.write(f"\n\n[ADDED] {clause.upper()} CLAUSE placeholder added by AI.\n")
 
 
-# ✅ FIXED ✅ Modify DOCX files with 3 arguments
-def modify_docx(input_path, output_path, missing_clauses):
-    doc = docx.Document(input_path)
-
+# ✅ Append a placeholder section for each missing clause (in place)
+def add_missing_clauses(doc, missing_clauses):
     for clause in missing_clauses:
         doc.add_heading(f"{clause.title()} Clause Added", level=2)
         doc.add_paragraph(
@@ -45,5 +106,16 @@ def modify_docx(input_path, output_path, missing_clauses):
             f"was missing the '{clause}' requirement."
         )
 
+    return doc
+
+
+# ✅ Write an opened Document to disk
+def save_docx(doc, output_path):
     doc.save(output_path)
     return output_path
+
+
+# ✅ FIXED ✅ Modify DOCX files with 3 arguments (input may be a path or an opened Document)
+def modify_docx(input_path, output_path, missing_clauses):
+    doc = add_missing_clauses(_as_document(input_path), missing_clauses)
+    return save_docx(doc, output_path)
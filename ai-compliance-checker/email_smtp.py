@@ -1,11 +1,83 @@
+import atexit
+import queue
 import smtplib
+import threading
+from collections import defaultdict
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
+# Warm SMTP connections keyed by (host, port, user); each item is (server, sent_count)
+_POOL_SIZE = 4
+# Recycle a connection after this many messages to stay under server-side limits
+_MAX_MESSAGES = 100
+
+_POOL = defaultdict(lambda: queue.Queue(maxsize=_POOL_SIZE))
+_POOL_LOCK = threading.Lock()
+
+
+def _connect(smtp_server, smtp_port, smtp_user, smtp_password):
+    server = smtplib.SMTP(smtp_server, smtp_port)
+    server.starttls()
+    server.login(smtp_user, smtp_password)
+    return server
+
+
+def _close(server):
+    try:
+        server.quit()
+    except Exception:
+        server.close()
+
+
+def _borrow(smtp_server, smtp_port, smtp_user, smtp_password):
+    """Return (key, server, sent_count), reusing a pooled connection if it is still alive."""
+    key = (smtp_server, smtp_port, smtp_user)
+    with _POOL_LOCK:
+        pool = _POOL[key]
+
+    while True:
+        try:
+            server, sent = pool.get_nowait()
+        except queue.Empty:
+            return key, _connect(smtp_server, smtp_port, smtp_user, smtp_password), 0
+
+        try:
+            server.noop()
+            return key, server, sent
+        except (smtplib.SMTPException, OSError):
+            # Stale connection (server timeout/disconnect): drop it and try the next one
+            server.close()
+
+
+def _return(key, server, sent):
+    if sent >= _MAX_MESSAGES:
+        _close(server)
+        return
+
+    with _POOL_LOCK:
+        pool = _POOL[key]
+    try:
+        pool.put_nowait((server, sent))
+    except queue.Full:
+        _close(server)
+
+
+@atexit.register
+def _close_pool():
+    with _POOL_LOCK:
+        pools = list(_POOL.values())
+    for pool in pools:
+        while True:
+            try:
+                server, _ = pool.get_nowait()
+            except queue.Empty:
+                break
+            _close(server)
+
 
 def send_email(subject, body, recipients, smtp_server, smtp_port, smtp_user, smtp_password):
     """
-    Sends an email using SMTP.
+    Sends an email using SMTP, reusing a pooled connection when possible.
     Returns a dictionary with status and message.
     """
 
@@ -18,14 +90,17 @@ def send_email(subject, body, recipients, smtp_server, smtp_port, smtp_user, smt
 
         msg.attach(MIMEText(body, "plain"))
 
-        # Connect to SMTP server
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(smtp_user, smtp_password)
+        # Borrow a warm SMTP connection (or open a new one)
+        key, server, sent = _borrow(smtp_server, smtp_port, smtp_user, smtp_password)
 
-        # Send email
-        server.sendmail(smtp_user, recipients, msg.as_string())
-        server.quit()
+        # Send email; a connection that failed mid-send is never put back
+        try:
+            server.sendmail(smtp_user, recipients, msg.as_string())
+        except Exception:
+            server.close()
+            raise
+
+        _return(key, server, sent + 1)
 
         return {
             "status": "sent",
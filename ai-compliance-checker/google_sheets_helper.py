@@ -1,10 +1,26 @@
 import os
+import functools
 import gspread
+from google.oauth2.service_account import Credentials
 from dotenv import load_dotenv
 
 # ✅ Load .env
 load_dotenv()
 
+SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
+
+
+@functools.lru_cache(maxsize=None)
+def get_credentials(creds_file):
+    """Parse the service-account key file once per path."""
+    return Credentials.from_service_account_file(creds_file, scopes=SCOPES)
+
+
+@functools.lru_cache(maxsize=None)
+def get_client(creds_file):
+    """Authorized gspread client per key file, reused across calls."""
+    return gspread.authorize(get_credentials(creds_file))
+
 def connect_to_sheet():
     sheet_id = os.getenv("GOOGLE_SHEET_ID")
     tab_name = os.getenv("GOOGLE_SHEET_TAB")
@@ -22,7 +38,7 @@ def connect_to_sheet():
         raise FileNotFoundError("service_account.json NOT FOUND. Check GOOGLE_SERVICE_CREDS path.")
 
     # ✅ Authenticate
-    client = gspread.service_account(filename=creds_file)
+    client = get_client(creds_file)
 
     # ✅ Open sheet
     sheet = client.open_by_key(sheet_id).worksheet(tab_name)
@@ -0,0 +1,93 @@
+import os
+import json
+import sqlite3
+import threading
+
+# ✅ On-disk run history (keeps the Flask process flat no matter how many uploads)
+HISTORY_DB = os.getenv("HISTORY_DB", "history.db")
+# Keep only the newest HISTORY_MAX runs so the table is self-bounded
+HISTORY_MAX = int(os.getenv("HISTORY_MAX", "200"))
+
+_conn = sqlite3.connect(HISTORY_DB, check_same_thread=False)
+_conn.row_factory = sqlite3.Row
+# One shared connection is used by request threads and background workers
+_lock = threading.Lock()
+
+with _lock:
+    _conn.execute("PRAGMA journal_mode=WAL")
+    _conn.execute("PRAGMA synchronous=NORMAL")
+    _conn.execute("PRAGMA cache_size=-65536")  # 64 MB page cache
+    _conn.execute(
+        """CREATE TABLE IF NOT EXISTS runs(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            original TEXT,
+            updated TEXT,
+            missing_json TEXT,
+            ts TEXT,
+            email_json TEXT,
+            sheet TEXT
+        )"""
+    )
+    _conn.commit()
+
+
+def _row_to_entry(row):
+    """Map a runs row back to the history dict shape the templates use."""
+    return {
+        "id": row["id"],
+        "original_filename": row["original"],
+        "saved_filename": row["original"],
+        "updated_filename": row["updated"],
+        "missing": json.loads(row["missing_json"]),
+        "timestamp": row["ts"],
+        "email_status": json.loads(row["email_json"]),
+        "sheet_status": row["sheet"],
+    }
+
+
+def add_run(original, updated, missing, timestamp, email_status, sheet_status):
+    """Insert a run, drop runs older than the newest HISTORY_MAX, and return the new id."""
+    with _lock, _conn:
+        cur = _conn.execute(
+            "INSERT INTO runs(original, updated, missing_json, ts, email_json, sheet) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (original, updated, json.dumps(missing), timestamp, json.dumps(email_status), sheet_status),
+        )
+        run_id = cur.lastrowid
+        # ids are AUTOINCREMENT, so this is a primary-key range delete
+        _conn.execute("DELETE FROM runs WHERE id <= ?", (run_id - HISTORY_MAX,))
+        return run_id
+
+
+def set_email_status(run_id, email_status):
+    with _lock, _conn:
+        _conn.execute("UPDATE runs SET email_json = ? WHERE id = ?", (json.dumps(email_status), run_id))
+
+
+def set_sheet_status(run_id, sheet_status):
+    with _lock, _conn:
+        _conn.execute("UPDATE runs SET sheet = ? WHERE id = ?", (sheet_status, run_id))
+
+
+def get_run(run_id):
+    with _lock:
+        row = _conn.execute("SELECT * FROM runs WHERE id = ?", (run_id,)).fetchone()
+    return _row_to_entry(row) if row else None
+
+
+def latest_run():
+    """Newest run's (updated, email_status, sheet_status), or None if there are no runs."""
+    with _lock:
+        row = _conn.execute(
+            "SELECT updated, email_json, sheet FROM runs ORDER BY id DESC LIMIT 1"
+        ).fetchone()
+    if row is None:
+        return None
+    return row["updated"], json.loads(row["email_json"]), row["sheet"]
+
+
+def recent_runs(limit=100):
+    """Newest-first list of history entries."""
+    with _lock:
+        rows = _conn.execute("SELECT * FROM runs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+    return [_row_to_entry(row) for row in rows]
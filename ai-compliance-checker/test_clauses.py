@@ -0,0 +1,34 @@
+import os
+from compliance_checker import CONTRACT_DIR, extract_text_from_docx, find_missing_clauses
+
+# ✅ Missing clauses per bundled contract (same as the original full-text fuzzy check)
+EXPECTED_MISSING = {
+    "sample contract.docx": ["Data Breach Notification", "Data Privacy Protection Right", "Business Associate Agreement"],
+    "sample contract 2.docx": [],
+    "sample contract 3.docx": ["Data Privacy Protection Right", "Data Processing Agreement"],
+    "sample contract 4.docx": ["Data Breach Notification", "Data Privacy Protection Right", "Data Processing Agreement"],
+    "testcontract.docx": [],
+}
+
+# ✅ Keywords must not fuzzy-match on their tail at a sentence boundary
+BOUNDARY_SENTENCES = {
+    "the terms set out in this agreement": "Business Associate Agreement",
+    "contract title: basic data agreement": "Data Processing Agreement",
+}
+
+
+def test_bundled_contracts():
+    for file_name, expected in EXPECTED_MISSING.items():
+        text = extract_text_from_docx(os.path.join(CONTRACT_DIR, file_name))
+        assert find_missing_clauses(text) == expected, file_name
+
+
+def test_sentence_boundaries():
+    for sentence, clause in BOUNDARY_SENTENCES.items():
+        assert clause in find_missing_clauses(sentence), sentence
+
+
+if __name__ == "__main__":
+    test_bundled_contracts()
+    test_sentence_boundaries()
+    print("✅ Clause detection checks passed!")